@@ -1,22 +1,179 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./todos.db"
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./todos.db"
 
-# check_same_thread=False is needed for SQLite with FastAPI
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# aiosqlite runs each connection on its own worker thread, so queries
+# don't block the event loop
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    """Have SQLite enforce foreign keys, including ON DELETE CASCADE."""
+    # SQLite leaves foreign keys off unless asked, per connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+event.listen(engine.sync_engine, "connect", enable_foreign_keys)
+
+# Objects are read after commit (e.g. to build responses), and an
+# AsyncSession can't lazily reload expired attributes
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
+def outdated_tables(connection) -> list[str]:
+    """Names of existing tables whose layout differs from the models."""
+    inspector = inspect(connection)
+    outdated = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        expected = {
+            column.name: column.type.compile(connection.dialect)
+            for column in table.columns
+        }
+        found = {
+            column["name"]: column["type"].compile(connection.dialect)
+            for column in inspector.get_columns(table.name)
+        }
+        differs = expected != found
+        if table.dialect_options["sqlite"]["autoincrement"]:
+            sql = connection.scalar(
+                text("SELECT sql FROM sqlite_master WHERE name = :name"),
+                {"name": table.name},
+            )
+            differs = differs or "AUTOINCREMENT" not in sql
+        if differs:
+            outdated.append(table.name)
+    return outdated
+
+
+def _count(connection, sql: str) -> int:
+    return connection.scalar(text(f"SELECT count(*) FROM {sql}"))
+
+
+def migrate_schema(connection):
+    """Convert todos.db from an earlier layout, keeping every todo.
+
+    Earlier versions used string IDs (all digits, e.g. "1764460800000"),
+    a JSON ``tags`` column instead of the ``todo_tags`` table, and due
+    dates as text. The old tables are renamed, the current ones created,
+    and the rows copied across in one transaction. Layouts that can't be
+    converted this way are left for ``check_schema`` to report.
+    """
+    if not outdated_tables(connection):
+        return
+    inspector = inspect(connection)
+    if not inspector.has_table("todos"):
+        return
+    todo_columns = {
+        column["name"]: column["type"].compile(connection.dialect)
+        for column in inspector.get_columns("todos")
+    }
+    has_tags_column = "tags" in todo_columns
+    has_todo_tags = inspector.has_table("todo_tags")
+    due_is_text = todo_columns.get("dueDate") != "INTEGER"
+
+    # Only convert what maps over exactly: IDs must already be canonical
+    # integers, due dates readable by SQLite, and tags JSON arrays
+    if not {"id", "text", "completed", "dueDate", "createdAt"} <= set(todo_columns):
+        return
+    if _count(
+        connection, "todos WHERE CAST(CAST(id AS INTEGER) AS TEXT) != CAST(id AS TEXT)"
+    ):
+        return
+    if due_is_text and _count(
+        connection,
+        "todos WHERE dueDate IS NOT NULL AND strftime('%s', dueDate) IS NULL",
+    ):
+        return
+    if has_tags_column and _count(
+        connection,
+        "todos WHERE tags IS NOT NULL "
+        "AND (NOT json_valid(tags) OR json_type(tags) NOT IN ('array', 'null'))",
+    ):
+        return
+
+    # SAVEPOINT opens a transaction even where the driver wouldn't (it
+    # leaves DDL in autocommit), so a failure leaves the old tables intact
+    connection.exec_driver_sql("SAVEPOINT migrate_schema")
+    old_tables = {"todos": "todos_old"}
+    if has_todo_tags:
+        old_tables = {"todo_tags": "todo_tags_old", **old_tables}
+    for name, old_name in old_tables.items():
+        # The old indexes move with the table and would clash by name
+        for index in inspector.get_indexes(name):
+            connection.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+        connection.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {old_name}")
+    Base.metadata.create_all(connection)
+
+    due_date = (
+        "CAST(strftime('%s', dueDate) AS INTEGER)" if due_is_text else "dueDate"
+    )
+    connection.exec_driver_sql(
+        "INSERT INTO todos (id, text, completed, dueDate, createdAt) "
+        f"SELECT CAST(id AS INTEGER), text, completed, {due_date}, createdAt "
+        "FROM todos_old"
+    )
+    if has_tags_column:
+        # Repeated tags keep their first position, as the tags setter does
+        connection.exec_driver_sql(
+            "INSERT INTO todo_tags (todo_id, tag, position) "
+            "SELECT CAST(todos_old.id AS INTEGER), tag.value, min(tag.key) "
+            "FROM todos_old, json_each(todos_old.tags) AS tag "
+            "WHERE tag.type = 'text' "
+            "GROUP BY todos_old.id, tag.value"
+        )
+    elif has_todo_tags:
+        connection.exec_driver_sql(
+            "INSERT INTO todo_tags (todo_id, tag, position) "
+            "SELECT CAST(todo_id AS INTEGER), tag, position FROM todo_tags_old "
+            # Foreign keys weren't enforced then, so skip orphaned tags
+            "WHERE todo_id IN (SELECT id FROM todos_old)"
+        )
+    for old_name in old_tables.values():
+        connection.exec_driver_sql(f"DROP TABLE {old_name}")
+    connection.exec_driver_sql("RELEASE migrate_schema")
+
+
+def check_schema(connection):
+    """Fail fast if existing tables don't match the current models.
+
+    ``create_all`` only adds missing tables; it never alters existing ones,
+    so a todos.db that ``migrate_schema`` couldn't convert would otherwise
+    fail on every request.
+    """
+    outdated = outdated_tables(connection)
+    if outdated:
+        raise RuntimeError(
+            f"Table {outdated[0]!r} was created by an older version of the "
+            "server and can't be converted automatically. Move todos.db aside "
+            "and re-run seed_data.py to start a new one."
+        )
+
+
+async def init_db():
+    """Create database tables if they don't exist.
+
+    A todos.db from an earlier version is converted to the current tables
+    first.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate_schema)
+        await conn.run_sync(check_schema)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def get_db():
     """Dependency to get database session."""
-    db = SessionLocal()
-    try:
+    # An AsyncSession must not be shared between concurrent requests, so each
+    # request gets its own. Creating one is cheap: it connects lazily and
+    # takes its connection from the engine's pool, which is where the
+    # per-request cost would otherwise be.
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
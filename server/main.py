@@ -1,76 +1,171 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
-from fastapi import FastAPI, HTTPException, Query, status, Depends
+from fastapi import FastAPI, HTTPException, Query, Request, status, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, Response
+from pydantic_core import to_json
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from dateutil import parser
+import re
 import time
 
-from database import engine, Base, get_db
-from models import Todo, CreateTodoRequest, UpdateTodoRequest, ErrorResponse, DBTodo
+from database import get_db, init_db
+from models import (
+    Todo,
+    CreateTodoRequest,
+    UpdateTodoRequest,
+    ErrorResponse,
+    DBTodo,
+    check_utc_range,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create database tables
+    await init_db()
+    yield
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="My Daily Tasks API",
     description="RESTful API for managing daily tasks",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
-# CORS middleware - allow requests from frontend dev servers
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
+# Frontend dev servers allowed by CORS. A frozenset, since the middleware
+# checks `origin in allow_origins` on every request.
+ORIGIN_SET = frozenset(
+    {
         "http://localhost:5173",  # Vite default
         "http://localhost:5174",
         "http://localhost:3000",
         "http://localhost:4173",  # Vite preview
         "http://localhost:8080",  # Previous frontend port
         "http://localhost:8081",  # Current frontend port
-    ],
+    }
+)
+
+# CORS middleware - allow requests from frontend dev servers
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=ORIGIN_SET,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 
-def generate_id() -> str:
-    """Generate a unique ID for a new todo."""
-    # Simple timestamp-based ID generation
-    # In a real app, UUIDs or DB auto-incrementing IDs might be better
-    # But we want to keep the ID format consistent with the previous implementation
-    return f"{int(time.time() * 1000)}"
+# Process start time (ms), so ETags from an earlier run never match
+_boot = int(time.time() * 1000)
+
+
+# Largest value SQLite can store in an INTEGER column
+MAX_TODO_ID = 2**63 - 1
+
+
+def parse_todo_id(id: str) -> int:
+    """Convert a todo ID from the URL; IDs that aren't numbers can't exist."""
+    # ASCII digits only: isdigit() alone also accepts e.g. full-width digits
+    todo_id = int(id) if id.isascii() and id.isdigit() else None
+    # Each todo has exactly one URL, so "01" doesn't reach todo 1
+    if todo_id is None or todo_id > MAX_TODO_ID or str(todo_id) != id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "NOT_FOUND", "message": "Todo not found"},
+        )
+    return todo_id
+
+
+# Bumped on every write through the API; together with the boot time it
+# identifies the current state of the todo list for ETag revalidation.
+# It lives in this process, so ETags assume a single server process and
+# don't notice writes made outside the API (e.g. by seed_data.py).
+_db_version = 0
+
+
+def bump_db_version() -> None:
+    """Invalidate ETags handed out for earlier states of the todo list."""
+    global _db_version
+    _db_version += 1
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches ``etag``.
+
+    The header may be ``*`` or a comma-separated list of entity tags,
+    compared weakly (ignoring any ``W/`` prefix).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+# The overall shape of an ISO 8601 date or date-time (extended or basic
+# format; calendar, week or ordinal date), checked before any parser runs
+# so garbage is rejected cheaply. It must never reject what the parsers
+# accept: T, W and Z may be lowercase, and digits are ASCII only.
+ISO_RE = re.compile(
+    r"\d{4}(-?W\d{2}(-?\d)?|-?\d{3}|(-?\d{2}){0,2})"
+    r"([T ]\d{2}(:?\d{2}){0,2}([.,]\d+)?)?"
+    r"(Z|[+-]\d{2}(:?\d{2})?)?",
+    re.ASCII | re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=512)
+def parse_iso_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 string, memoized for repeated query values."""
+    if not ISO_RE.fullmatch(value):
+        raise ValueError("not an ISO 8601 date-time")
+    try:
+        # The frontend sends Date.toISOString() output, which the
+        # stdlib parser (implemented in C) handles; dateutil covers the
+        # rarer variants.
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = parser.isoparse(value)
+    # Due dates are compared as UTC epoch seconds
+    return check_utc_range(parsed)
 
 
-@app.get("/api/todos", response_model=list[Todo])
+@app.get("/api/todos")
 async def get_todos(
+    request: Request,
     dueBefore: Optional[str] = Query(
         None, description="Filter todos with due date on or before this date"
     ),
     tags: Optional[str] = Query(
         None, description="Comma-separated list of tags to filter by"
     ),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ) -> list[Todo]:
     """
     Get all todos with optional filtering.
 
     - **dueBefore**: Returns todos where dueDate <= dueBefore (inclusive). Also includes todos without a due date.
     - **tags**: Returns todos that have ALL specified tags (AND operation). Case-sensitive.
-    """
-    query = db.query(DBTodo)
 
-    # Filter by due date
+    Responses carry an ETag; a matching If-None-Match gets a 304 without
+    touching the database.
+    """
+    # Validate the filters before answering from the ETag, so a bad
+    # dueBefore is a 400 even when If-None-Match would match
+    due_before_dt = None
     if dueBefore:
         try:
-            due_before_dt = parser.isoparse(dueBefore)
-            # Filter: dueDate is NULL OR dueDate <= due_before_dt
-            query = query.filter(
-                (DBTodo.dueDate.is_(None)) | (DBTodo.dueDate <= due_before_dt)
-            )
-        except (ValueError, parser.ParserError) as e:
+            due_before_dt = parse_iso_datetime(dueBefore)
+        except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail={
@@ -83,28 +178,65 @@ async def get_todos(
                 },
             )
 
-    # Execute query to get results for tag filtering in Python
-    # (JSON filtering in SQLite can be tricky depending on version/extensions)
-    todos = query.all()
+    etag = f'W/"{_boot:x}-{_db_version}-{hash((dueBefore, tags)):x}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
 
-    # Filter by tags (AND operation - todo must have all specified tags)
-    if tags:
-        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-        todos = [todo for todo in todos if all(tag in todo.tags for tag in tag_list)]
+    query = select(DBTodo)
 
-    # Sort by createdAt descending (newest first)
-    todos.sort(key=lambda x: x.createdAt, reverse=True)
+    # Filter by due date
+    if due_before_dt is not None:
+        # Filter: dueDate is NULL OR dueDate <= due_before_dt
+        query = query.where(
+            (DBTodo.dueDate.is_(None)) | (DBTodo.dueDate <= due_before_dt)
+        )
 
-    return todos
+    # Filter by tags (AND operation - todo must have all specified tags).
+    # todo_tags rows for the requested tags are grouped per todo, and only
+    # todos that matched all of them leave the database
+    if tags:
+        required = frozenset(tag.strip() for tag in tags.split(",")) - {""}
+        if required:
+            query = query.where(DBTodo.has_all_tags(required))
+
+    # Sort by createdAt descending (newest first), served by the
+    # (createdAt, id) index
+    query = query.order_by(DBTodo.createdAt.desc(), DBTodo.id.desc())
+    # Stream the rows in batches so ORM objects for the whole table are
+    # never alive at once; each one is dropped once its model is built
+    todos = await db.stream_scalars(query.execution_options(yield_per=500))
+
+    # Rows come straight from the database, so skip building Todo models
+    # and let pydantic-core write plain dicts (in Todo field order) straight
+    # to JSON bytes. Returning a Response skips FastAPI's jsonable_encoder
+    # and response validation; the return annotation still documents the
+    # response schema.
+    data = [
+        {
+            "id": str(todo.id),
+            "text": todo.text,
+            "completed": todo.completed,
+            "dueDate": todo.dueDate,
+            "tags": todo.tags,
+            "createdAt": todo.createdAt,
+        }
+        async for todo in todos
+    ]
+    return Response(
+        content=to_json(data),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
 
 
 @app.post("/api/todos", response_model=Todo, status_code=status.HTTP_201_CREATED)
 async def create_todo(
-    request: CreateTodoRequest, db: Session = Depends(get_db)
+    request: CreateTodoRequest, db: AsyncSession = Depends(get_db)
 ) -> Todo:
     """Create a new todo item."""
     new_todo = DBTodo(
-        id=generate_id(),
         text=request.text,
         completed=False,
         dueDate=request.dueDate,
@@ -113,17 +245,39 @@ async def create_todo(
     )
 
     db.add(new_todo)
-    db.commit()
-    db.refresh(new_todo)
+    await db.commit()
+    bump_db_version()
+    # Every column was set above and the session doesn't expire on commit,
+    # so the object already matches the row; no refresh SELECT needed
     return new_todo
 
 
 @app.patch("/api/todos/{id}", response_model=Todo)
 async def update_todo(
-    id: str, request: UpdateTodoRequest, db: Session = Depends(get_db)
+    id: str, request: UpdateTodoRequest, db: AsyncSession = Depends(get_db)
 ) -> Todo:
     """Update an existing todo."""
-    todo = db.query(DBTodo).filter(DBTodo.id == id).first()
+    todo_id = parse_todo_id(id)
+    # Update only the fields that are provided
+    update_data = request.model_dump(exclude_unset=True)
+    # Tags live in their own table and are replaced through the relationship
+    column_data = {
+        field: value for field, value in update_data.items() if field != "tags"
+    }
+
+    if column_data:
+        # A single UPDATE ... RETURNING applies the change and reads the
+        # updated row back, with no SELECT before or refresh after. The
+        # session holds no other objects, so there's nothing to synchronize.
+        todo = await db.scalar(
+            update(DBTodo)
+            .where(DBTodo.id == todo_id)
+            .values(**column_data)
+            .returning(DBTodo)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        todo = await db.get(DBTodo, todo_id)
 
     if not todo:
         raise HTTPException(
@@ -131,9 +285,6 @@ async def update_todo(
             detail={"error": "NOT_FOUND", "message": "Todo not found"},
         )
 
-    # Update only the fields that are provided
-    update_data = request.model_dump(exclude_unset=True)
-
     # Check if at least one field is being updated
     if not update_data:
         raise HTTPException(
@@ -144,34 +295,48 @@ async def update_todo(
             },
         )
 
-    for field, value in update_data.items():
-        setattr(todo, field, value)
+    if "tags" in update_data:
+        todo.tags = update_data["tags"] or []
 
-    db.commit()
-    db.refresh(todo)
+    await db.commit()
+    bump_db_version()
     return todo
 
 
 @app.delete("/api/todos/{id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_todo(id: str, db: Session = Depends(get_db)):
+async def delete_todo(id: str, db: AsyncSession = Depends(get_db)):
     """Delete a todo item."""
-    todo = db.query(DBTodo).filter(DBTodo.id == id).first()
+    todo_id = parse_todo_id(id)
+    # Delete in SQL without loading the todo first; its todo_tags rows go
+    # with it through the foreign key's ON DELETE CASCADE
+    result = await db.execute(
+        delete(DBTodo)
+        .where(DBTodo.id == todo_id)
+        .execution_options(synchronize_session=False)
+    )
 
-    if not todo:
+    if not result.rowcount:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"error": "NOT_FOUND", "message": "Todo not found"},
         )
 
-    db.delete(todo)
-    db.commit()
+    await db.commit()
+    bump_db_version()
     return None
 
 
 @app.post("/api/todos/{id}/toggle", response_model=Todo)
-async def toggle_todo(id: str, db: Session = Depends(get_db)) -> Todo:
+async def toggle_todo(id: str, db: AsyncSession = Depends(get_db)) -> Todo:
     """Toggle the completion status of a todo."""
-    todo = db.query(DBTodo).filter(DBTodo.id == id).first()
+    todo_id = parse_todo_id(id)
+    todo = await db.scalar(
+        update(DBTodo)
+        .where(DBTodo.id == todo_id)
+        .values(completed=~DBTodo.completed)
+        .returning(DBTodo)
+        .execution_options(synchronize_session=False)
+    )
 
     if not todo:
         raise HTTPException(
@@ -179,9 +344,8 @@ async def toggle_todo(id: str, db: Session = Depends(get_db)) -> Todo:
             detail={"error": "NOT_FOUND", "message": "Todo not found"},
         )
 
-    todo.completed = not todo.completed
-    db.commit()
-    db.refresh(todo)
+    await db.commit()
+    bump_db_version()
 
     return todo
 
@@ -199,9 +363,9 @@ async def http_exception_handler(request, exc: HTTPException):
 
 # Health check endpoint
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     """Health check endpoint."""
-    count = db.query(DBTodo).count()
+    count = await db.scalar(select(func.count()).select_from(DBTodo))
     return {"status": "ok", "todos_count": count}
 
 
@@ -1,22 +1,157 @@
-from datetime import datetime
+import calendar
+from datetime import datetime, timedelta
 from typing import Optional
-from pydantic import BaseModel, Field, ConfigDict
-from sqlalchemy import Column, String, Boolean, DateTime, JSON
+from pydantic import BaseModel, Field, ConfigDict, field_validator
+from sqlalchemy import (
+    Column,
+    String,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    TypeDecorator,
+    func,
+    select,
+)
+from sqlalchemy.orm import relationship, validates
 from database import Base
 
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_seconds(value: datetime) -> int:
+    """Whole seconds since the epoch; naive datetimes are taken as UTC."""
+    return calendar.timegm(value.utctimetuple())
+
+
+def check_utc_range(value: Optional[datetime]) -> Optional[datetime]:
+    """Reject datetimes whose UTC time falls outside year 1 to 9999.
+
+    Such values (e.g. 9999-12-31T23:00:00-05:00) can't be stored as epoch
+    seconds; raising ValueError lets callers turn this into a 4xx.
+    """
+    if value is not None:
+        try:
+            to_epoch_seconds(value)
+        except OverflowError:
+            raise ValueError("date is out of range once converted to UTC")
+    return value
+
+
+def from_epoch_seconds(value: int) -> datetime:
+    """Naive UTC datetime for a number of seconds since the epoch."""
+    return EPOCH + timedelta(seconds=value)
+
+
+class EpochSeconds(TypeDecorator):
+    """A datetime stored as an INTEGER of seconds since the Unix epoch.
+
+    Range filters compare integers instead of ISO strings. Aware datetimes
+    are converted to UTC; values come back as naive UTC datetimes.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_epoch_seconds(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_epoch_seconds(value)
+
+
+class TodoTag(Base):
+    """One tag on a todo, so tag filters can use an index."""
+
+    __tablename__ = "todo_tags"
+    # (tag, todo_id) answers "which todos carry this tag" from the index alone
+    __table_args__ = (Index("ix_todo_tags_tag_todo", "tag", "todo_id"),)
+
+    todo_id = Column(
+        Integer, ForeignKey("todos.id", ondelete="CASCADE"), primary_key=True
+    )
+    tag = Column(String, primary_key=True)
+    # Tags are returned in the order they were given
+    position = Column(Integer, nullable=False)
+
 
 class DBTodo(Base):
     """SQLAlchemy ORM model for Todo."""
 
     __tablename__ = "todos"
+    # (createdAt, id) lets the newest-first listing walk the index in order,
+    # with id as a deterministic tie-breaker for equal timestamps.
+    # AUTOINCREMENT keeps SQLite from reusing the ID of a deleted todo, which
+    # a stale client could otherwise update or delete by mistake.
+    __table_args__ = (
+        Index("ix_todos_createdAt_id", "createdAt", "id"),
+        {"sqlite_autoincrement": True},
+    )
 
-    id = Column(String, primary_key=True, index=True)
+    # INTEGER PRIMARY KEY aliases SQLite's rowid, so lookups by id and joins
+    # from todo_tags use the table's own B-tree; the API exposes it as a string
+    id = Column(Integer, primary_key=True)
     text = Column(String, nullable=False)
     completed = Column(Boolean, default=False)
-    dueDate = Column(DateTime, nullable=True)
-    tags = Column(JSON, default=list)
+    dueDate = Column(EpochSeconds, nullable=True, index=True)
     createdAt = Column(DateTime, default=datetime.now)
 
+    # Loaded with one extra SELECT per batch of todos; the async session
+    # can't lazy-load on attribute access
+    _tags = relationship(
+        TodoTag,
+        order_by=TodoTag.position,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="selectin",
+    )
+
+    @validates("dueDate")
+    def _normalize_due_date(self, key, value):
+        # Hold the value as it will read back from the database, so a todo
+        # returned straight after commit matches later reads
+        return None if value is None else from_epoch_seconds(to_epoch_seconds(value))
+
+    @property
+    def tags(self) -> list[str]:
+        return [todo_tag.tag for todo_tag in self._tags]
+
+    @tags.setter
+    def tags(self, value: list[str]) -> None:
+        # A todo carries each tag once
+        self._tags = [
+            TodoTag(tag=tag, position=position)
+            for position, tag in enumerate(dict.fromkeys(value))
+        ]
+
+    @classmethod
+    def has_tag(cls, tag: str):
+        """SQL condition matching todos that carry ``tag``."""
+        return cls.id.in_(select(TodoTag.todo_id).where(TodoTag.tag == tag))
+
+    @classmethod
+    def has_all_tags(cls, tags: set[str]):
+        """SQL condition matching todos that carry every tag in ``tags``.
+
+        One grouped pass over the (tag, todo_id) index, rather than a
+        separate subquery per tag.
+        """
+        return cls.id.in_(
+            select(TodoTag.todo_id)
+            .where(TodoTag.tag.in_(tags))
+            .group_by(TodoTag.todo_id)
+            .having(func.count() == len(tags))
+        )
+
+    @staticmethod
+    def tag_rows(todo_id: int, tags: list[str]) -> list[dict]:
+        """``todo_tags`` rows for a bulk insert of ``tags`` on ``todo_id``."""
+        return [
+            {"todo_id": todo_id, "tag": tag, "position": position}
+            for position, tag in enumerate(dict.fromkeys(tags))
+        ]
+
 
 class Todo(BaseModel):
     """Todo model matching the OpenAPI specification."""
@@ -24,15 +159,23 @@ class Todo(BaseModel):
     model_config = ConfigDict(
         # Allow datetime to be serialized as ISO 8601 strings
         json_encoders={datetime: lambda v: v.isoformat()},
+        # Integer database IDs are strings in the API
+        coerce_numbers_to_str=True,
         from_attributes=True,  # Enable ORM mode
     )
 
     id: str
     text: str = Field(..., min_length=1, max_length=500)
     completed: bool
-    dueDate: Optional[datetime] = None
+    # The two timestamps use different clocks: dueDate is stored as epoch
+    # seconds and returned in UTC, createdAt is the server's local time
+    dueDate: Optional[datetime] = Field(
+        None, description="Due date in UTC (naive), truncated to whole seconds"
+    )
     tags: list[str] = Field(default_factory=list)
-    createdAt: datetime
+    createdAt: datetime = Field(
+        ..., description="Creation time in the server's local time (naive)"
+    )
 
 
 class CreateTodoRequest(BaseModel):
@@ -42,6 +185,8 @@ class CreateTodoRequest(BaseModel):
     dueDate: Optional[datetime] = None
     tags: list[str] = Field(default_factory=list)
 
+    _check_due_date = field_validator("dueDate")(check_utc_range)
+
 
 class UpdateTodoRequest(BaseModel):
     """Request model for updating an existing todo. All fields are optional."""
@@ -53,6 +198,8 @@ class UpdateTodoRequest(BaseModel):
     dueDate: Optional[datetime] = None
     tags: Optional[list[str]] = None
 
+    _check_due_date = field_validator("dueDate")(check_utc_range)
+
 
 class ErrorResponse(BaseModel):
     """Error response model."""
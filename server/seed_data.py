@@ -1,14 +1,13 @@
 """
 Script to insert 100 fake todo records with due dates anchored to today.
 """
+import asyncio
 import random
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
-from models import DBTodo
-
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+from datetime import datetime, timedelta, timezone
+from itertools import permutations
+from sqlalchemy import func, insert, select
+from database import SessionLocal, init_db
+from models import DBTodo, TodoTag
 
 # Sample task templates for different tags
 TASK_TEMPLATES = {
@@ -98,103 +97,129 @@ FILLERS = {
 }
 
 
-def generate_task_text(tag: str) -> str:
-    """Generate a realistic task text for the given tag."""
-    template = random.choice(TASK_TEMPLATES[tag])
-    if "{}" in template:
-        # Replace placeholders with appropriate fillers
-        num_placeholders = template.count("{}")
-        fillers = random.sample(FILLERS[tag], min(num_placeholders, len(FILLERS[tag])))
-        return template.format(*fillers)
-    return template
-
-
-def generate_due_date(today: datetime) -> datetime:
-    """Generate a due date relative to today (between -30 and +30 days)."""
-    # 30% past due, 40% today/this week, 30% future
-    rand = random.random()
-    if rand < 0.3:
-        # Past due: -30 to -1 days
-        days_offset = random.randint(-30, -1)
-    elif rand < 0.7:
-        # Current/upcoming: 0 to 7 days
-        days_offset = random.randint(0, 7)
-    else:
-        # Future: 8 to 30 days
-        days_offset = random.randint(8, 30)
-    
+# Every ordered pair of distinct fillers per tag, so one draw fills a
+# template with up to two different placeholders
+FILLER_PAIRS = {tag: list(permutations(words, 2)) for tag, words in FILLERS.items()}
+
+# Due dates relative to today: 30% past due (-30 to -1 days), 40% today or
+# this week (0 to 7 days), 30% future (8 to 30 days)
+DUE_DAY_OFFSETS = range(-30, 31)
+DUE_DAY_WEIGHTS = [
+    0.3 / 30 if days < 0 else 0.4 / 8 if days <= 7 else 0.3 / 23
+    for days in DUE_DAY_OFFSETS
+]
+
+
+def generate_task_texts(tag: str, k: int) -> list[str]:
+    """Generate ``k`` realistic task texts for the given tag."""
+    templates = random.choices(TASK_TEMPLATES[tag], k=k)
+    filler_pairs = random.choices(FILLER_PAIRS[tag], k=k)
+    # format() ignores fillers beyond the template's placeholders
+    return [
+        template.format(*fillers)
+        for template, fillers in zip(templates, filler_pairs)
+    ]
+
+
+def generate_due_dates(today: datetime, k: int) -> list[datetime]:
+    """Generate ``k`` due dates relative to today (between -30 and +30 days)."""
+    days_offsets = random.choices(DUE_DAY_OFFSETS, weights=DUE_DAY_WEIGHTS, k=k)
     # Add some random hours to make it more realistic
-    hours_offset = random.randint(0, 23)
-    due_date = today + timedelta(days=days_offset, hours=hours_offset)
-    return due_date
+    hours_offsets = random.choices(range(24), k=k)
+    return [
+        today + timedelta(days=days, hours=hours)
+        for days, hours in zip(days_offsets, hours_offsets)
+    ]
 
 
-def seed_database(num_records: int = 100):
+async def seed_database(num_records: int = 100):
     """Insert fake todo records into the database."""
-    db: Session = SessionLocal()
-    
-    try:
-        # Get today's date
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Available tags
-        available_tags = ["personal", "groceries", "course", "work"]
-        
-        print(f"Inserting {num_records} fake todo records...")
-        
-        for i in range(num_records):
-            # Randomly select 1-2 tags for each todo
-            num_tags = random.choices([1, 2], weights=[0.7, 0.3])[0]
-            selected_tags = random.sample(available_tags, num_tags)
-            
-            # Generate task text based on primary tag
-            primary_tag = selected_tags[0]
-            task_text = generate_task_text(primary_tag)
-            
-            # Generate due date anchored to today
-            due_date = generate_due_date(today)
+    # Create tables if they don't exist
+    await init_db()
+
+    async with SessionLocal() as db:
+        try:
+            # Get today's date (UTC, the zone due dates are stored in)
+            today = datetime.now(timezone.utc).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            )
             
-            # Randomly set some todos as completed (20% chance)
-            completed = random.random() < 0.2
+            # Available tags
+            available_tags = ["personal", "groceries", "course", "work"]
             
-            # Create timestamp-like ID
-            todo_id = f"{int(today.timestamp() * 1000) + i}"
+            print(f"Inserting {num_records} fake todo records...")
             
-            # Create the todo
-            new_todo = DBTodo(
-                id=todo_id,
-                text=task_text,
-                completed=completed,
-                dueDate=due_date,
-                tags=selected_tags,
-                createdAt=datetime.now(),
+            # Draw every random value up front, one call per kind of value:
+            # 1-2 tags per todo, and ~20% of todos already completed
+            tag_counts = random.choices([1, 2], weights=[0.7, 0.3], k=num_records)
+            # The first tags of a random ordering of all tags are a random
+            # sample of them
+            tag_orders = random.choices(
+                list(permutations(available_tags)), k=num_records
             )
+            completed_flags = random.choices(
+                [True, False], weights=[0.2, 0.8], k=num_records
+            )
+            # Due dates anchored to today
+            due_dates = generate_due_dates(today, num_records)
+
+            # Task text is based on the primary tag, so generate each tag's
+            # texts in one batch and hand them out in row order
+            primary_tags = [tag_order[0] for tag_order in tag_orders]
+            task_texts = {
+                tag: iter(generate_task_texts(tag, primary_tags.count(tag)))
+                for tag in available_tags
+            }
+
+            rows = []
+            row_tags = []
+            for num_tags, tag_order, completed, due_date in zip(
+                tag_counts, tag_orders, completed_flags, due_dates
+            ):
+                rows.append(
+                    {
+                        "text": next(task_texts[tag_order[0]]),
+                        "completed": completed,
+                        "dueDate": due_date,
+                        "createdAt": datetime.now(),
+                    }
+                )
+                row_tags.append(list(tag_order[:num_tags]))
             
-            db.add(new_todo)
+            # Insert all records with one executemany per table in one
+            # transaction; RETURNING hands back the assigned IDs in row order
+            async with db.begin():
+                todo_ids = await db.scalars(
+                    insert(DBTodo).returning(DBTodo.id, sort_by_parameter_order=True),
+                    rows,
+                )
+                tag_rows = [
+                    tag_row
+                    for todo_id, tags in zip(todo_ids, row_tags)
+                    for tag_row in DBTodo.tag_rows(todo_id, tags)
+                ]
+                await db.execute(insert(TodoTag), tag_rows)
+            print(f"✓ Successfully inserted {num_records} fake todo records!")
+
+            async def count(*criteria) -> int:
+                return await db.scalar(
+                    select(func.count()).select_from(DBTodo).where(*criteria)
+                )
+
+            # Print some statistics
+            print("\nStatistics:")
+            print(f"  - Records with 'personal' tag: {await count(DBTodo.has_tag('personal'))}")
+            print(f"  - Records with 'groceries' tag: {await count(DBTodo.has_tag('groceries'))}")
+            print(f"  - Records with 'course' tag: {await count(DBTodo.has_tag('course'))}")
+            print(f"  - Records with 'work' tag: {await count(DBTodo.has_tag('work'))}")
+            print(f"  - Completed todos: {await count(DBTodo.completed)}")
+            print(f"  - Past due todos: {await count(DBTodo.dueDate < today)}")
             
-            if (i + 1) % 10 == 0:
-                print(f"  Inserted {i + 1}/{num_records} records...")
-        
-        # Commit all records
-        db.commit()
-        print(f"✓ Successfully inserted {num_records} fake todo records!")
-        
-        # Print some statistics
-        print("\nStatistics:")
-        print(f"  - Records with 'personal' tag: {db.query(DBTodo).filter(DBTodo.tags.contains(['personal'])).count()}")
-        print(f"  - Records with 'groceries' tag: {db.query(DBTodo).filter(DBTodo.tags.contains(['groceries'])).count()}")
-        print(f"  - Records with 'course' tag: {db.query(DBTodo).filter(DBTodo.tags.contains(['course'])).count()}")
-        print(f"  - Records with 'work' tag: {db.query(DBTodo).filter(DBTodo.tags.contains(['work'])).count()}")
-        print(f"  - Completed todos: {db.query(DBTodo).filter(DBTodo.completed).count()}")
-        print(f"  - Past due todos: {db.query(DBTodo).filter(DBTodo.dueDate < today).count()}")
-        
-    except Exception as e:
-        db.rollback()
-        print(f"✗ Error inserting records: {e}")
-        raise
-    finally:
-        db.close()
+        except Exception as e:
+            await db.rollback()
+            print(f"✗ Error inserting records: {e}")
+            raise
 
 
 if __name__ == "__main__":
-    seed_database(100)
+    asyncio.run(seed_database(100))
@@ -1,48 +1,262 @@
+import asyncio
 import pytest
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import event, func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.pool import StaticPool
 
 from main import app
-from database import Base, get_db
+from database import (
+    Base,
+    check_schema,
+    enable_foreign_keys,
+    get_db,
+    migrate_schema,
+)
+from models import DBTodo, Todo, TodoTag
 
-# Setup in-memory database for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Setup in-memory database for testing. Under pytest-xdist every worker is
+# its own process, so each one gets a separate in-memory database.
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, poolclass=StaticPool)
+TestingSessionLocal = async_sessionmaker(
+    engine, autoflush=False, expire_on_commit=False
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-@pytest.fixture(autouse=True)
+# The sqlite3 driver doesn't emit BEGIN before a SAVEPOINT, which would
+# make releasing the savepoint commit for real. Turn off its transaction
+# handling and let SQLAlchemy emit BEGIN itself.
+@event.listens_for(engine.sync_engine, "connect")
+def _disable_driver_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+event.listen(engine.sync_engine, "connect", enable_foreign_keys)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _fast_sqlite(dbapi_connection, connection_record):
+    # The test database is thrown away, so skip journaling and fsyncs
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+async def _run_ddl(fn):
+    async with engine.begin() as conn:
+        await conn.run_sync(fn)
+
+
+@pytest.fixture(scope="session", autouse=True)
 def clear_db():
-    """Clear the database before each test."""
-    Base.metadata.create_all(bind=engine)
+    """Create the schema once for the whole test session."""
+    asyncio.run(_run_ddl(Base.metadata.create_all))
+    yield
+    # Tests never commit past their own transaction, so there's no data to
+    # delete; closing the only connection discards the in-memory database
+    asyncio.run(engine.dispose())
+
+
+# Session the current test's requests run in, set by the db_session fixture
+_test_session_var: ContextVar = ContextVar("_test_session")
+
+
+async def _begin_test_session():
+    connection = await engine.connect()
+    transaction = await connection.begin()
+    # Commits inside the app release a SAVEPOINT instead of committing the
+    # outer transaction, which is rolled back when the test ends
+    session = TestingSessionLocal(
+        bind=connection, join_transaction_mode="create_savepoint"
+    )
+    return connection, transaction, session
+
+
+async def _end_test_session(connection, transaction, session):
+    await session.close()
+    await transaction.rollback()
+    await connection.close()
+
+
+@contextmanager
+def _rolled_back_session():
+    """Route requests to a session whose changes are rolled back on exit."""
+    connection, transaction, session = asyncio.run(_begin_test_session())
+    token = _test_session_var.set(session)
+    try:
+        yield session
+    finally:
+        _test_session_var.reset(token)
+        asyncio.run(_end_test_session(connection, transaction, session))
+
+
+@pytest.fixture(autouse=True)
+def db_session():
+    """Run each test inside a transaction that is rolled back afterwards."""
+    with _rolled_back_session() as session:
+        yield session
+
+
+async def override_get_db():
+    """Override dependency to use the current test's session."""
+    # The session belongs to the db_session fixture, which closes it
+    session = _test_session_var.get()
+    yield session
+    # Each request starts with an empty identity map, as with a fresh session
+    session.expunge_all()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def override_dependencies():
+    """Point the app at the test database for this process."""
+    app.dependency_overrides[get_db] = override_get_db
     yield
-    Base.metadata.drop_all(bind=engine)
+    app.dependency_overrides.clear()
+
+
+@contextmanager
+def _recorded_statements():
+    """Collect the SQL statements sent to the test database."""
+    statements = []
 
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
 
-def override_get_db():
-    """Override dependency to use test database."""
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
     try:
-        db = TestingSessionLocal()
-        yield db
+        yield statements
     finally:
-        db.close()
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
 
 
-app.dependency_overrides[get_db] = override_get_db
+async def _init_schema_after(*statements):
+    """Run init_db's schema steps on a fresh database set up by statements.
+
+    Returns the RuntimeError from check_schema, if any, and the todos and
+    todo_tags rows left afterwards.
+    """
+    other_engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+    event.listen(other_engine.sync_engine, "connect", enable_foreign_keys)
+    error = None
+    try:
+        async with other_engine.connect() as conn:
+            for statement in statements:
+                await conn.execute(text(statement))
+            await conn.commit()
+            try:
+                await conn.run_sync(migrate_schema)
+                await conn.run_sync(check_schema)
+            except RuntimeError as exc:
+                error = exc
+            todos = (await conn.execute(text("SELECT * FROM todos"))).all()
+            tags = []
+            if await conn.run_sync(lambda sync: inspect(sync).has_table("todo_tags")):
+                tags = (await conn.execute(text("SELECT * FROM todo_tags"))).all()
+    finally:
+        await other_engine.dispose()
+    return error, todos, tags
+
+
+# todos as created by the first release, with string IDs and JSON tags
+BASELINE_TODOS_DDL = (
+    "CREATE TABLE todos (id VARCHAR NOT NULL PRIMARY KEY, "
+    "text VARCHAR NOT NULL, completed BOOLEAN, dueDate DATETIME, "
+    "tags JSON, createdAt DATETIME)"
+)
+
+
+async def _explain(session, statement):
+    result = await session.execute(text(statement))
+    return [row.detail for row in result]
+
+
+async def _insert_todos(session, rows):
+    row_tags = [row.pop("tags") for row in rows]
+    todo_ids = await session.scalars(
+        insert(DBTodo).returning(DBTodo.id, sort_by_parameter_order=True), rows
+    )
+    tag_rows = [
+        tag_row
+        for todo_id, tags in zip(todo_ids, row_tags)
+        for tag_row in DBTodo.tag_rows(todo_id, tags)
+    ]
+    if tag_rows:
+        await session.execute(insert(TodoTag), tag_rows)
+    await session.commit()
+
+
+@pytest.fixture
+def seed_todos(db_session):
+    """Insert todos straight into the test database, bypassing the API."""
+
+    def seed(rows):
+        now = datetime.now()
+        # Later rows get later createdAt values, as if POSTed in order
+        todos = [
+            {
+                "completed": False,
+                "dueDate": None,
+                "tags": [],
+                "createdAt": now + timedelta(microseconds=i),
+                **row,
+            }
+            for i, row in enumerate(rows)
+        ]
+        asyncio.run(_insert_todos(db_session, todos))
+
+    return seed
+
+
+async def _add_todo(session, todo):
+    session.add(todo)
+    await session.commit()
+    # Requests should load the todo themselves, as they would in the app
+    session.expunge(todo)
 
 
 @pytest.fixture
-def client():
-    """Create a test client."""
-    return TestClient(app)
+def make_todo(db_session):
+    """Create one todo directly in the test database and return its JSON."""
+
+    def make(text="Task", completed=False, dueDate=None, tags=()):
+        todo = DBTodo(
+            text=text,
+            completed=completed,
+            dueDate=dueDate,
+            tags=list(tags),
+            createdAt=datetime.now(),
+        )
+        asyncio.run(_add_todo(db_session, todo))
+        return Todo.model_validate(todo).model_dump(mode="json")
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def client(clear_db, override_dependencies):
+    """Create a test client shared by all tests."""
+    # Not entered as a context manager: that would run the app lifespan,
+    # which creates tables in the real ./todos.db
+    client = TestClient(app)
+    # Pay one-time costs (first connection, lazy schema and serializer
+    # builds) here rather than inside whichever test happens to run first
+    with _rolled_back_session():
+        client.get("/health")
+        client.get("/api/todos")
+    return client
 
 
 class TestHealthCheck:
@@ -66,7 +280,7 @@ class TestGetTodos:
         assert response.status_code == 200
         assert response.json() == []
 
-    def test_get_all_todos(self, client):
+    def test_get_all_todos(self, client, db_session):
         """Test getting all todos."""
         # Create test todos
         todo1 = client.post(
@@ -80,39 +294,29 @@ class TestGetTodos:
         # Get all todos
         response = client.get("/api/todos")
         assert response.status_code == 200
-        todos = response.json()
-        assert len(todos) == 2
-        # Should be sorted by createdAt descending (newest first)
-        assert todos[0]["id"] == todo2["id"]
-        assert todos[1]["id"] == todo1["id"]
 
-    def test_filter_by_due_date(self, client):
+        # Count and order come from the database: newest first
+        query = select(DBTodo.id).order_by(DBTodo.createdAt.desc(), DBTodo.id.desc())
+        ids = asyncio.run(db_session.scalars(query)).all()
+        assert [str(id) for id in ids] == [todo2["id"], todo1["id"]]
+        # The endpoint returns them in the same order
+        assert [todo["id"] for todo in response.json()] == [todo2["id"], todo1["id"]]
+
+    def test_filter_by_due_date(self, client, seed_todos):
         """Test filtering todos by due date."""
         today = datetime.now()
         tomorrow = today + timedelta(days=1)
         next_week = today + timedelta(days=7)
 
         # Create todos with different due dates
-        client.post(
-            "/api/todos",
-            json={
-                "text": "Due today",
-                "dueDate": today.isoformat(),
-                "tags": ["urgent"],
-            },
+        seed_todos(
+            [
+                {"text": "Due today", "dueDate": today, "tags": ["urgent"]},
+                {"text": "Due next week", "dueDate": next_week, "tags": ["work"]},
+                {"text": "No due date", "tags": ["personal"]},
+            ]
         )
 
-        client.post(
-            "/api/todos",
-            json={
-                "text": "Due next week",
-                "dueDate": next_week.isoformat(),
-                "tags": ["work"],
-            },
-        )
-
-        client.post("/api/todos", json={"text": "No due date", "tags": ["personal"]})
-
         # Filter by tomorrow (should include today and no due date)
         response = client.get(f"/api/todos?dueBefore={tomorrow.isoformat()}")
         assert response.status_code == 200
@@ -123,16 +327,16 @@ class TestGetTodos:
         assert "No due date" in texts
         assert "Due next week" not in texts
 
-    def test_filter_by_single_tag(self, client):
+    def test_filter_by_single_tag(self, client, seed_todos):
         """Test filtering todos by a single tag."""
-        client.post(
-            "/api/todos", json={"text": "Work task", "tags": ["work", "important"]}
+        seed_todos(
+            [
+                {"text": "Work task", "tags": ["work", "important"]},
+                {"text": "Personal task", "tags": ["personal"]},
+                {"text": "Another work task", "tags": ["work"]},
+            ]
         )
 
-        client.post("/api/todos", json={"text": "Personal task", "tags": ["personal"]})
-
-        client.post("/api/todos", json={"text": "Another work task", "tags": ["work"]})
-
         # Filter by "work" tag
         response = client.get("/api/todos?tags=work")
         assert response.status_code == 200
@@ -141,13 +345,15 @@ class TestGetTodos:
         for todo in todos:
             assert "work" in todo["tags"]
 
-    def test_filter_by_multiple_tags(self, client):
+    def test_filter_by_multiple_tags(self, client, seed_todos, db_session):
         """Test filtering todos by multiple tags (AND operation)."""
-        client.post("/api/todos", json={"text": "Task 1", "tags": ["work", "urgent"]})
-
-        client.post("/api/todos", json={"text": "Task 2", "tags": ["work"]})
-
-        client.post("/api/todos", json={"text": "Task 3", "tags": ["urgent"]})
+        seed_todos(
+            [
+                {"text": "Task 1", "tags": ["work", "urgent"]},
+                {"text": "Task 2", "tags": ["work"]},
+                {"text": "Task 3", "tags": ["urgent"]},
+            ]
+        )
 
         # Filter by both "work" AND "urgent"
         response = client.get("/api/todos?tags=work,urgent")
@@ -158,36 +364,38 @@ class TestGetTodos:
         assert "work" in todos[0]["tags"]
         assert "urgent" in todos[0]["tags"]
 
-    def test_filter_by_due_date_and_tags(self, client):
+        # The tag filter is answered from the todo_tags index
+        query = select(DBTodo).where(DBTodo.has_all_tags({"work", "urgent"}))
+        sql = query.compile(engine.sync_engine, compile_kwargs={"literal_binds": True})
+        plan = asyncio.run(_explain(db_session, f"EXPLAIN QUERY PLAN {sql}"))
+        assert any("ix_todo_tags_tag_todo" in step for step in plan)
+
+    def test_filter_by_repeated_tag(self, client, seed_todos):
+        """Test that repeating a tag in the filter matches like a single tag."""
+        seed_todos(
+            [
+                {"text": "Task 1", "tags": ["work"]},
+                {"text": "Task 2", "tags": ["personal"]},
+            ]
+        )
+
+        response = client.get("/api/todos?tags=work, work,")
+        assert response.status_code == 200
+        todos = response.json()
+        assert len(todos) == 1
+        assert todos[0]["text"] == "Task 1"
+
+    def test_filter_by_due_date_and_tags(self, client, seed_todos):
         """Test filtering by both due date and tags."""
         today = datetime.now()
         next_week = today + timedelta(days=7)
 
-        client.post(
-            "/api/todos",
-            json={
-                "text": "Work due soon",
-                "dueDate": today.isoformat(),
-                "tags": ["work"],
-            },
-        )
-
-        client.post(
-            "/api/todos",
-            json={
-                "text": "Personal due soon",
-                "dueDate": today.isoformat(),
-                "tags": ["personal"],
-            },
-        )
-
-        client.post(
-            "/api/todos",
-            json={
-                "text": "Work due later",
-                "dueDate": next_week.isoformat(),
-                "tags": ["work"],
-            },
+        seed_todos(
+            [
+                {"text": "Work due soon", "dueDate": today, "tags": ["work"]},
+                {"text": "Personal due soon", "dueDate": today, "tags": ["personal"]},
+                {"text": "Work due later", "dueDate": next_week, "tags": ["work"]},
+            ]
         )
 
         # Filter by due date and work tag
@@ -198,6 +406,54 @@ class TestGetTodos:
         assert len(todos) == 1
         assert todos[0]["text"] == "Work due soon"
 
+    def test_unchanged_list_returns_not_modified(self, client):
+        """Test that a matching If-None-Match returns 304 with no body."""
+        client.post("/api/todos", json={"text": "Task", "tags": ["work"]})
+
+        response = client.get("/api/todos?tags=work")
+        etag = response.headers["etag"]
+
+        cached = client.get("/api/todos?tags=work", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+
+        # A different filter is a different representation
+        other = client.get("/api/todos?tags=home", headers={"If-None-Match": etag})
+        assert other.status_code == 200
+
+    @pytest.mark.parametrize(
+        "if_none_match",
+        ['"stale", {etag}', '{etag}, W/"other"', "*", '"stale",{etag}'],
+    )
+    def test_if_none_match_list_and_wildcard(self, client, if_none_match):
+        """Test that an ETag list containing the current tag, or *, matches."""
+        etag = client.get("/api/todos").headers["etag"]
+
+        response = client.get(
+            "/api/todos", headers={"If-None-Match": if_none_match.format(etag=etag)}
+        )
+        assert response.status_code == 304
+
+    def test_invalid_due_date_is_rejected_before_etag_check(self, client):
+        """Test that a bad dueBefore gets a 400 even with If-None-Match: *."""
+        response = client.get(
+            "/api/todos?dueBefore=garbage", headers={"If-None-Match": "*"}
+        )
+        assert response.status_code == 400
+        assert response.json()["error"] == "VALIDATION_ERROR"
+
+    def test_etag_changes_after_mutation(self, client):
+        """Test that writes invalidate previously issued ETags."""
+        todo = client.post("/api/todos", json={"text": "Task"}).json()
+        etag = client.get("/api/todos").headers["etag"]
+
+        client.post(f"/api/todos/{todo['id']}/toggle")
+
+        response = client.get("/api/todos", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()[0]["completed"] is True
+        assert response.headers["etag"] != etag
+
     def test_invalid_due_date_format(self, client):
         """Test that invalid due date format returns 400 error."""
         response = client.get("/api/todos?dueBefore=invalid-date")
@@ -206,6 +462,47 @@ class TestGetTodos:
         assert error["error"] == "VALIDATION_ERROR"
         assert "dueBefore" in error["details"]["field"]
 
+    def test_due_date_outside_utc_range_is_rejected(self, client):
+        """Test that a dueBefore before year 1 in UTC returns 400."""
+        response = client.get(
+            "/api/todos", params={"dueBefore": "0001-01-01T00:00:00+01:00"}
+        )
+        assert response.status_code == 400
+        assert response.json()["error"] == "VALIDATION_ERROR"
+
+    def test_due_date_with_non_ascii_digits_is_rejected(self, client):
+        """Test that a dueBefore written in full-width digits returns 400."""
+        response = client.get(
+            "/api/todos", params={"dueBefore": "\uff12\uff10\uff12\uff15-12-01"}
+        )
+        assert response.status_code == 400
+        assert response.json()["error"] == "VALIDATION_ERROR"
+
+    @pytest.mark.parametrize(
+        "due_before,included",
+        [
+            ("2025-W48-1", ["Due Nov 24"]),  # week date: Monday of week 48
+            ("2025-335", ["Due Nov 24", "Due Dec 1"]),  # ordinal date: Dec 1
+            ("2025-12-01t00:00:00z", ["Due Nov 24", "Due Dec 1"]),  # RFC 3339
+            ("2025-12-01T00:00:00z", ["Due Nov 24", "Due Dec 1"]),
+        ],
+    )
+    def test_filter_by_other_iso_due_date_forms(
+        self, client, seed_todos, due_before, included
+    ):
+        """Test week and ordinal dates and lowercase t/z are accepted."""
+        seed_todos(
+            [
+                {"text": "Due Nov 24", "dueDate": datetime(2025, 11, 24)},
+                {"text": "Due Dec 1", "dueDate": datetime(2025, 12, 1)},
+                {"text": "Due Dec 2", "dueDate": datetime(2025, 12, 2)},
+            ]
+        )
+
+        response = client.get("/api/todos", params={"dueBefore": due_before})
+        assert response.status_code == 200
+        assert sorted(t["text"] for t in response.json()) == sorted(included)
+
 
 class TestCreateTodo:
     """Test POST /api/todos endpoint."""
@@ -219,7 +516,7 @@ class TestCreateTodo:
         assert todo["completed"] is False
         assert todo["tags"] == []
         assert todo["dueDate"] is None
-        assert "id" in todo
+        assert isinstance(todo["id"], str)
         assert "createdAt" in todo
 
     def test_create_todo_with_all_fields(self, client):
@@ -240,6 +537,27 @@ class TestCreateTodo:
         assert todo["dueDate"] is not None
         assert todo["completed"] is False
 
+    def test_due_date_is_stored_in_utc_to_the_second(self, client):
+        """Test that due dates are converted to UTC and truncated to seconds."""
+        response = client.post(
+            "/api/todos",
+            json={"text": "Offset due date", "dueDate": "2025-12-01T02:00:00.750+02:00"},
+        )
+        assert response.status_code == 201
+        assert response.json()["dueDate"] == "2025-12-01T00:00:00"
+
+        # Reading it back from the database gives the same value
+        todos = client.get("/api/todos").json()
+        assert todos[0]["dueDate"] == "2025-12-01T00:00:00"
+
+    def test_create_todo_with_due_date_outside_utc_range(self, client):
+        """Test that a due date past year 9999 in UTC is a validation error."""
+        response = client.post(
+            "/api/todos",
+            json={"text": "Far future", "dueDate": "9999-12-31T23:00:00-05:00"},
+        )
+        assert response.status_code == 422
+
     def test_create_todo_without_text(self, client):
         """Test that creating todo without text returns validation error."""
         response = client.post("/api/todos", json={})
@@ -254,10 +572,10 @@ class TestCreateTodo:
 class TestUpdateTodo:
     """Test PATCH /api/todos/{id} endpoint."""
 
-    def test_update_todo_text(self, client):
+    def test_update_todo_text(self, client, make_todo):
         """Test updating todo text."""
         # Create a todo
-        todo = client.post("/api/todos", json={"text": "Original text"}).json()
+        todo = make_todo(text="Original text")
 
         # Update text
         response = client.patch(
@@ -268,18 +586,18 @@ class TestUpdateTodo:
         assert updated["text"] == "Updated text"
         assert updated["id"] == todo["id"]
 
-    def test_update_todo_completion(self, client):
+    def test_update_todo_completion(self, client, make_todo):
         """Test updating todo completion status."""
-        todo = client.post("/api/todos", json={"text": "Task to complete"}).json()
+        todo = make_todo(text="Task to complete")
 
         response = client.patch(f"/api/todos/{todo['id']}", json={"completed": True})
         assert response.status_code == 200
         updated = response.json()
         assert updated["completed"] is True
 
-    def test_update_todo_tags(self, client):
+    def test_update_todo_tags(self, client, make_todo):
         """Test updating todo tags."""
-        todo = client.post("/api/todos", json={"text": "Task", "tags": ["old"]}).json()
+        todo = make_todo(text="Task", tags=["old"])
 
         response = client.patch(
             f"/api/todos/{todo['id']}", json={"tags": ["new", "updated"]}
@@ -288,9 +606,9 @@ class TestUpdateTodo:
         updated = response.json()
         assert updated["tags"] == ["new", "updated"]
 
-    def test_update_todo_due_date(self, client):
+    def test_update_todo_due_date(self, client, make_todo):
         """Test updating todo due date."""
-        todo = client.post("/api/todos", json={"text": "Task"}).json()
+        todo = make_todo(text="Task")
 
         new_date = datetime(2025, 12, 31, 23, 59, 59)
         response = client.patch(
@@ -300,20 +618,37 @@ class TestUpdateTodo:
         updated = response.json()
         assert updated["dueDate"] is not None
 
-    def test_update_multiple_fields(self, client):
-        """Test updating multiple fields at once."""
-        todo = client.post("/api/todos", json={"text": "Original"}).json()
+    def test_update_due_date_outside_utc_range(self, client, make_todo):
+        """Test that a due date past year 9999 in UTC is a validation error."""
+        todo = make_todo(text="Task")
 
         response = client.patch(
-            f"/api/todos/{todo['id']}",
-            json={"text": "Updated", "completed": True, "tags": ["updated"]},
+            f"/api/todos/{todo['id']}", json={"dueDate": "9999-12-31T23:00:00-05:00"}
         )
+        assert response.status_code == 422
+
+    def test_update_multiple_fields(self, client, make_todo):
+        """Test updating multiple fields at once."""
+        todo = make_todo(text="Original")
+
+        with _recorded_statements() as statements:
+            response = client.patch(
+                f"/api/todos/{todo['id']}",
+                json={"text": "Updated", "completed": True, "tags": ["updated"]},
+            )
         assert response.status_code == 200
         updated = response.json()
         assert updated["text"] == "Updated"
         assert updated["completed"] is True
         assert updated["tags"] == ["updated"]
 
+        # All fields are written in one transaction; in tests, the app's
+        # commit releases the savepoint it runs in
+        transaction_control = [
+            sql for sql in statements if sql.startswith(("SAVEPOINT", "RELEASE"))
+        ]
+        assert len(transaction_control) == 2
+
     def test_update_nonexistent_todo(self, client):
         """Test updating a nonexistent todo returns 404."""
         response = client.patch("/api/todos/nonexistent", json={"text": "Updated"})
@@ -321,9 +656,23 @@ class TestUpdateTodo:
         error = response.json()
         assert error["error"] == "NOT_FOUND"
 
-    def test_update_with_no_fields(self, client):
+    @pytest.mark.parametrize("todo_id", ["9" * 30, "\uff11", "01"])
+    def test_non_canonical_ids_are_not_found(self, client, make_todo, todo_id):
+        """Test that oversized, non-ASCII and zero-padded IDs return 404."""
+        # A real todo 1 exists, which "\uff11" or "01" must not reach
+        make_todo(text="Task")
+
+        for response in (
+            client.patch(f"/api/todos/{todo_id}", json={"text": "Updated"}),
+            client.post(f"/api/todos/{todo_id}/toggle"),
+            client.delete(f"/api/todos/{todo_id}"),
+        ):
+            assert response.status_code == 404
+            assert response.json()["error"] == "NOT_FOUND"
+
+    def test_update_with_no_fields(self, client, make_todo):
         """Test updating with no fields returns 400."""
-        todo = client.post("/api/todos", json={"text": "Task"}).json()
+        todo = make_todo(text="Task")
 
         response = client.patch(f"/api/todos/{todo['id']}", json={})
         assert response.status_code == 400
@@ -332,10 +681,10 @@ class TestUpdateTodo:
 class TestDeleteTodo:
     """Test DELETE /api/todos/{id} endpoint."""
 
-    def test_delete_todo(self, client):
+    def test_delete_todo(self, client, make_todo):
         """Test deleting a todo."""
         # Create a todo
-        todo = client.post("/api/todos", json={"text": "To be deleted"}).json()
+        todo = make_todo(text="To be deleted")
 
         # Delete it
         response = client.delete(f"/api/todos/{todo['id']}")
@@ -345,6 +694,24 @@ class TestDeleteTodo:
         get_response = client.get("/api/todos")
         assert len(get_response.json()) == 0
 
+    def test_delete_todo_removes_its_tags(self, client, make_todo, db_session):
+        """Test that deleting a todo cascades to its todo_tags rows."""
+        todo = make_todo(text="Tagged", tags=["work", "urgent"])
+
+        response = client.delete(f"/api/todos/{todo['id']}")
+        assert response.status_code == 204
+
+        remaining = asyncio.run(db_session.scalar(select(func.count(TodoTag.tag))))
+        assert remaining == 0
+
+    def test_deleted_todo_id_is_not_reused(self, client, make_todo):
+        """Test that a new todo never gets the ID of a deleted one."""
+        todo = make_todo(text="Newest")
+        client.delete(f"/api/todos/{todo['id']}")
+
+        new_todo = client.post("/api/todos", json={"text": "Next"}).json()
+        assert new_todo["id"] != todo["id"]
+
     def test_delete_nonexistent_todo(self, client):
         """Test deleting a nonexistent todo returns 404."""
         response = client.delete("/api/todos/nonexistent")
@@ -356,9 +723,9 @@ class TestDeleteTodo:
 class TestToggleTodo:
     """Test POST /api/todos/{id}/toggle endpoint."""
 
-    def test_toggle_incomplete_to_complete(self, client):
+    def test_toggle_incomplete_to_complete(self, client, make_todo):
         """Test toggling incomplete todo to complete."""
-        todo = client.post("/api/todos", json={"text": "Task to toggle"}).json()
+        todo = make_todo(text="Task to toggle")
         assert todo["completed"] is False
 
         response = client.post(f"/api/todos/{todo['id']}/toggle")
@@ -366,11 +733,9 @@ class TestToggleTodo:
         toggled = response.json()
         assert toggled["completed"] is True
 
-    def test_toggle_complete_to_incomplete(self, client):
+    def test_toggle_complete_to_incomplete(self, client, make_todo):
         """Test toggling complete todo to incomplete."""
-        # Create and mark as complete
-        todo = client.post("/api/todos", json={"text": "Completed task"}).json()
-        client.patch(f"/api/todos/{todo['id']}", json={"completed": True})
+        todo = make_todo(text="Completed task", completed=True)
 
         # Toggle back to incomplete
         response = client.post(f"/api/todos/{todo['id']}/toggle")
@@ -378,9 +743,9 @@ class TestToggleTodo:
         toggled = response.json()
         assert toggled["completed"] is False
 
-    def test_toggle_multiple_times(self, client):
+    def test_toggle_multiple_times(self, client, make_todo):
         """Test toggling a todo multiple times."""
-        todo = client.post("/api/todos", json={"text": "Toggle test"}).json()
+        todo = make_todo(text="Toggle test")
 
         # Toggle 1: incomplete -> complete
         response1 = client.post(f"/api/todos/{todo['id']}/toggle")
@@ -402,6 +767,74 @@ class TestToggleTodo:
         assert error["error"] == "NOT_FOUND"
 
 
+class TestDatabaseSchema:
+    """Test the startup migration and check for older databases."""
+
+    def test_current_schema_passes(self, db_session):
+        """Test that tables created from the current models pass the check."""
+        connection = asyncio.run(db_session.connection())
+        asyncio.run(connection.run_sync(check_schema))
+
+    def test_baseline_todos_are_migrated(self):
+        """Test that todos from the first release are converted, not lost."""
+        error, todos, tags = asyncio.run(
+            _init_schema_after(
+                BASELINE_TODOS_DDL,
+                "CREATE INDEX ix_todos_id ON todos (id)",
+                "INSERT INTO todos VALUES ('1764460800000', 'Task', 1, "
+                "'2025-12-01 02:30:00.500000', '[\"work\", \"urgent\", \"work\"]', "
+                "'2025-11-30 10:00:00.000000')",
+                "INSERT INTO todos VALUES ('1764460800001', 'Untagged', 0, "
+                "NULL, '[]', '2025-11-30 10:00:01.000000')",
+            )
+        )
+
+        assert error is None
+        assert sorted(todos) == [
+            (1764460800000, "Task", 1, 1764556200, "2025-11-30 10:00:00.000000"),
+            (1764460800001, "Untagged", 0, None, "2025-11-30 10:00:01.000000"),
+        ]
+        assert sorted(tags) == [
+            (1764460800000, "urgent", 1),
+            (1764460800000, "work", 0),
+        ]
+
+    def test_todo_tags_layout_is_migrated(self):
+        """Test that todos with tags already in todo_tags are converted."""
+        error, todos, tags = asyncio.run(
+            _init_schema_after(
+                "CREATE TABLE todos (id INTEGER NOT NULL PRIMARY KEY, "
+                "text VARCHAR NOT NULL, completed BOOLEAN, dueDate DATETIME, "
+                "createdAt DATETIME)",
+                "CREATE TABLE todo_tags (todo_id INTEGER NOT NULL, "
+                "tag VARCHAR NOT NULL, position INTEGER NOT NULL, "
+                "PRIMARY KEY (todo_id, tag))",
+                "CREATE INDEX ix_todo_tags_tag_todo ON todo_tags (tag, todo_id)",
+                "INSERT INTO todos VALUES (1, 'Task', 0, "
+                "'2025-12-01 00:00:00.000000', '2025-11-30 10:00:00.000000')",
+                "INSERT INTO todo_tags VALUES (1, 'work', 0), (2, 'orphan', 0)",
+            )
+        )
+
+        assert error is None
+        assert todos == [(1, "Task", 0, 1764547200, "2025-11-30 10:00:00.000000")]
+        assert tags == [(1, "work", 0)]
+
+    def test_unconvertible_todos_table_is_rejected(self):
+        """Test that IDs that aren't integers stop startup, leaving the data."""
+        error, todos, tags = asyncio.run(
+            _init_schema_after(
+                BASELINE_TODOS_DDL,
+                "INSERT INTO todos VALUES ('19a2b3c', 'Task', 0, NULL, '[]', "
+                "'2025-11-30 10:00:00.000000')",
+            )
+        )
+
+        assert isinstance(error, RuntimeError)
+        assert "can't be converted" in str(error)
+        assert [todo.id for todo in todos] == ["19a2b3c"]
+
+
 class TestIntegrationScenarios:
     """Test complete user scenarios."""
 
@@ -431,11 +864,10 @@ class TestIntegrationScenarios:
         all_todos = client.get("/api/todos").json()
         assert len(all_todos) == 0
 
-    def test_filter_completed_vs_incomplete(self, client):
+    def test_filter_completed_vs_incomplete(self, client, seed_todos):
         """Test managing completed and incomplete todos."""
         # Create multiple todos
-        for i in range(3):
-            client.post("/api/todos", json={"text": f"Task {i + 1}", "tags": ["batch"]})
+        seed_todos([{"text": f"Task {i + 1}", "tags": ["batch"]} for i in range(3)])
 
         # Get all
         all_todos = client.get("/api/todos").json()